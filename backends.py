@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+
+import dotenv
+
+
+# Approximate USD per 1k characters of prompt and reply, from the published
+# per-token input prices at about 4 characters per token
+GEMINI_COSTS = {
+    "gemini-2.5-pro": 0.0003125,
+    "gemini-2.5-flash-lite": 0.000025,
+    "gemini-2.5-flash": 0.000075,
+    "gemini-2.0-flash-lite": 0.00001875,
+    "gemini-2.0-flash": 0.000025,
+    "gemini-1.5-pro": 0.0003125,
+    "gemini-1.5-flash": 0.00001875,
+}
+
+
+class ModelBackend:
+    """
+    Base class for the model backends used by TherapistCompanion.
+    Subclasses must override generate or generate_stream (or both); each
+    default is built on the other, and the async versions on those.
+    """
+
+    model = "base"
+    # USD per 1k characters of prompt and reply, used for the cascade's savings report
+    cost = 0.0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.generate is ModelBackend.generate and cls.generate_stream is ModelBackend.generate_stream:
+            raise TypeError(f"{cls.__name__} must override generate or generate_stream")
+
+    def __new__(cls, *args, **kwargs):
+        if cls is ModelBackend:
+            raise TypeError("ModelBackend is a base class, use one of its subclasses")
+        return super().__new__(cls)
+
+    def generate(self, contents, system_prompt):
+        """Return the full reply text for the conversation contents"""
+        return "".join(self.generate_stream(contents, system_prompt))
+
+    def generate_stream(self, contents, system_prompt):
+        """Yield the reply text in chunks as it is produced"""
+        yield self.generate(contents, system_prompt)
+
+    async def agenerate(self, contents, system_prompt):
+        """Async generate, runs the blocking call in a worker thread by default"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate, contents, system_prompt)
+
+    async def agenerate_stream(self, contents, system_prompt):
+        """Async generate_stream, pulls each chunk from a worker thread by default"""
+        loop = asyncio.get_running_loop()
+        done = object()
+        chunks = self.generate_stream(contents, system_prompt)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, done)
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            try:
+                chunks.close()
+            except ValueError:
+                # Cancelled while a worker thread is still inside next(),
+                # the generator is closed once that call returns instead
+                pass
+
+
+class GeminiBackend(ModelBackend):
+    """Backend for the hosted Gemini models through google-genai"""
+
+    def __init__(self, api_key=None, model="gemini-2.0-flash", cost=None):
+        from google import genai
+
+        self.client = genai.Client(
+            api_key=api_key or dotenv.dotenv_values(".env")["API"],
+        )
+        self.model = model
+        if cost is None:
+            # Longest prefix first, so "gemini-2.0-flash-lite" doesn't match "gemini-2.0-flash"
+            for name in sorted(GEMINI_COSTS, key=len, reverse=True):
+                if model.startswith(name):
+                    cost = GEMINI_COSTS[name]
+                    break
+        self.cost = cost or 0.0
+
+    def _config(self, system_prompt):
+        from google.genai import types
+
+        return types.GenerateContentConfig(
+            response_mime_type="text/plain",
+            system_instruction=[
+                types.Part.from_text(text=system_prompt)
+            ],
+        )
+
+    def generate(self, contents, system_prompt):
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=self._config(system_prompt),
+        )
+        return response.text
+
+    def generate_stream(self, contents, system_prompt):
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=self._config(system_prompt),
+        ):
+            if chunk.text:
+                yield chunk.text
+
+    async def agenerate(self, contents, system_prompt):
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=self._config(system_prompt),
+        )
+        return response.text
+
+    async def agenerate_stream(self, contents, system_prompt):
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=self._config(system_prompt),
+        ):
+            if chunk.text:
+                yield chunk.text
+
+
+class LocalBackend(ModelBackend):
+    """
+    Backend running a quantised GGUF model on the CPU through llama-cpp-python.
+    Works without a network connection once the model file is on disk.
+    The model is not thread-safe, so calls from worker threads take turns.
+    """
+
+    def __init__(self, model_path, n_ctx=2048, n_threads=None, max_tokens=256, temperature=0.7):
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            raise ImportError(
+                "llama-cpp-python is not installed. "
+                "Install it using: pip install llama-cpp-python"
+            )
+
+        self.model = os.path.basename(model_path)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.lock = threading.Lock()
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads or os.cpu_count(),
+            verbose=False,
+        )
+
+    def _messages(self, contents, system_prompt):
+        """Convert google-genai contents into chat-completion messages"""
+        messages = [{"role": "system", "content": system_prompt}]
+        for content in contents:
+            role = "assistant" if content.role == "model" else "user"
+            text = "".join(part.text or "" for part in content.parts)
+            messages.append({"role": role, "content": text})
+        return messages
+
+    def generate(self, contents, system_prompt):
+        with self.lock:
+            result = self.llm.create_chat_completion(
+                messages=self._messages(contents, system_prompt),
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+            )
+        return result["choices"][0]["message"]["content"]
+
+    def generate_stream(self, contents, system_prompt):
+        # The completion runs in its own thread, which takes and releases the
+        # lock itself. A consumer that stops early only sets stop, so the lock
+        # never waits on this generator being closed or garbage-collected.
+        messages = self._messages(contents, system_prompt)
+        chunks = queue.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                with self.lock:
+                    for chunk in self.llm.create_chat_completion(
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        stream=True,
+                    ):
+                        if stop.is_set():
+                            break
+                        text = chunk["choices"][0]["delta"].get("content")
+                        if text:
+                            chunks.put(text)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(done)
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+
+class ScriptedBackend(ModelBackend):
+    """
+    Deterministic backend that plays back canned replies in order.
+    Useful for tests and for running the apps without any model.
+    """
+
+    def __init__(self, replies=None, model="scripted", latency=0.0, chunk_size=16, cost=0.0):
+        self.replies = list(replies or [])
+        self.model = model
+        self.latency = latency
+        self.cost = cost
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def _next_reply(self):
+        if self.replies:
+            reply = self.replies[self.calls % len(self.replies)]
+        else:
+            reply = json.dumps({
+                "response": "I'm here with you. Tell me more about how you're feeling.",
+                "emotion_detected": "neutral",
+                "therapist_expression": "listening"
+            })
+        self.calls += 1
+        return reply
+
+    def generate(self, contents, system_prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next_reply()
+
+    def generate_stream(self, contents, system_prompt):
+        reply = self.generate(contents, system_prompt)
+        for i in range(0, len(reply), self.chunk_size):
+            yield reply[i:i + self.chunk_size]
+
+    async def agenerate(self, contents, system_prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next_reply()
+
+    async def agenerate_stream(self, contents, system_prompt):
+        reply = await self.agenerate(contents, system_prompt)
+        for i in range(0, len(reply), self.chunk_size):
+            yield reply[i:i + self.chunk_size]
+
+
+def backend_from_env(env_path=".env"):
+    """
+    Pick a backend from the .env file.
+    LOCAL_MODEL selects the CPU backend, otherwise API is used for Gemini.
+    FAST_MODEL puts a cascade in front, trying that model first on simple turns.
+    MODEL_COST and FAST_MODEL_COST override the price per 1k characters.
+    Returns None when neither is configured.
+    """
+    env = dotenv.dotenv_values(env_path)
+    if env.get("LOCAL_MODEL"):
+        backend = LocalBackend(env["LOCAL_MODEL"])
+    elif env.get("API"):
+        backend = GeminiBackend(api_key=env["API"], model=env.get("MODEL") or "gemini-2.0-flash")
+    else:
+        return None
+    if env.get("MODEL_COST"):
+        backend.cost = float(env["MODEL_COST"])
+
+    if env.get("FAST_MODEL"):
+        from router import CascadeBackend
+
+        if env["FAST_MODEL"].endswith(".gguf"):
+            fast = LocalBackend(env["FAST_MODEL"])
+        else:
+            fast = GeminiBackend(api_key=env.get("API"), model=env["FAST_MODEL"])
+        if env.get("FAST_MODEL_COST"):
+            fast.cost = float(env["FAST_MODEL_COST"])
+        backend = CascadeBackend(fast, backend)
+    return backend
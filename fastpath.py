@@ -0,0 +1,140 @@
+import random
+import re
+
+
+GREETINGS = [
+    "hi", "hii", "hey", "heya", "hello", "hallo", "yo", "hiya", "howdy", "sup",
+    "good morning", "good afternoon", "good evening", "morning", "evening",
+    "greetings",
+]
+
+GOODBYES = [
+    "bye", "byee", "bye bye", "goodbye", "good bye", "good night", "goodnight",
+    "see you", "see ya", "see you later", "see you soon", "later", "cya",
+    "take care", "gotta go", "got to go", "farewell", "talk later",
+    "talk to you later", "ttyl",
+]
+
+# Words that may trail a greeting or goodbye without making the turn non-trivial
+TRIVIAL_FILLERS = [
+    "there", "you", "again", "everyone", "friend", "buddy", "then", "for now",
+    "now", "all", "for today", "dear",
+]
+
+CRISIS_PHRASES = [
+    "suicide", "suicidal", "kill myself", "killing myself", "end my life",
+    "end it all", "take my own life", "want to die", "wanna die",
+    "better off dead", "no reason to live", "self harm", "self-harm",
+    "hurt myself", "hurting myself", "cut myself", "cutting myself",
+    "overdose",
+]
+
+DISTRESS_PHRASES = [
+    "hopeless", "worthless", "can't go on", "cant go on", "panic attack",
+    "abuse", "abused", "can't cope", "cant cope", "falling apart",
+    "breaking down", "so alone",
+]
+
+TEMPLATES = {
+    "greeting": [
+        "Hi there! It's really good to see you. How are you feeling today?",
+        "Hello! I'm glad you stopped by. What's on your mind?",
+        "Hey! It's nice to hear from you. How has your day been so far?",
+        "Hi! Good to see you. Is there anything you'd like to talk about today?",
+        "Hello again! How are you doing right now, honestly?",
+    ],
+    "goodbye": [
+        "Leaving already? I hope you're okay. Take good care of yourself, and come back whenever you need to talk.",
+        "Goodbye for now. Please be gentle with yourself, and remember I'm here whenever you want to talk.",
+        "Take care of yourself. If anything is weighing on you, I'm always here to listen.",
+        "I'll miss our chat. I hope the rest of your day is kind to you. Come back anytime.",
+        "Bye for now. Remember to rest and look after yourself. I'm here when you need me.",
+    ],
+}
+
+TEMPLATE_LABELS = {
+    "greeting": ("neutral", "smiling"),
+    "goodbye": ("neutral", "concerned"),
+}
+
+
+def _alternation(phrases):
+    """Build a regex alternation, longest phrase first so it wins over its prefixes"""
+    escaped = []
+    for phrase in sorted(set(phrases), key=len, reverse=True):
+        escaped.append(r"\s+".join(re.escape(word) for word in phrase.split()))
+    return "|".join(escaped)
+
+
+class PhraseMatcher:
+    """
+    Matches several labelled phrase lists with one precompiled regex,
+    so a single scan over the text finds every category.
+    """
+
+    def __init__(self, categories, whole_words=True):
+        self.names = {}
+        groups = []
+        for i, (label, phrases) in enumerate(categories.items()):
+            group = f"g{i}"
+            self.names[group] = label
+            pattern = _alternation(phrases)
+            if whole_words:
+                pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+            groups.append(f"(?P<{group}>{pattern})")
+        self.pattern = re.compile("|".join(groups), re.IGNORECASE)
+
+    def first(self, text):
+        """Return the label of the earliest match in text, or None"""
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        return self.names[match.lastgroup]
+
+    def labels(self, text):
+        """Return the set of labels found anywhere in text"""
+        return {self.names[match.lastgroup] for match in self.pattern.finditer(text)}
+
+
+SIGNAL_MATCHER = PhraseMatcher({"crisis": CRISIS_PHRASES, "distress": DISTRESS_PHRASES})
+
+
+class FastPath:
+    """
+    Answers trivial turns (a bare greeting or goodbye) from local templates
+    and flags crisis language before anything is sent to the model.
+    """
+
+    def __init__(self, name="Thera", rng=None):
+        names = [name.lower(), "thera"]
+        fillers = _alternation(TRIVIAL_FILLERS + names)
+        self.trivial = re.compile(
+            rf"\W*(?:(?P<greeting>{_alternation(GREETINGS)})|(?P<goodbye>{_alternation(GOODBYES)}))"
+            rf"(?:\W+(?:{fillers}))*[\W_]*",
+            re.IGNORECASE,
+        )
+        self.rng = rng or random.Random()
+        self.last_template = {}
+
+    def is_crisis(self, text):
+        return "crisis" in SIGNAL_MATCHER.labels(text)
+
+    def trivial_kind(self, text):
+        """Return "greeting" or "goodbye" if text is nothing more than that, else None"""
+        match = self.trivial.fullmatch(text.strip())
+        if match is None:
+            return None
+        return match.lastgroup
+
+    def reply(self, kind):
+        """Pick a template reply for kind, never the same one twice in a row"""
+        pool = TEMPLATES[kind]
+        choices = [text for text in pool if text != self.last_template.get(kind)]
+        text = self.rng.choice(choices)
+        self.last_template[kind] = text
+        emotion, expression = TEMPLATE_LABELS[kind]
+        return {
+            "response": text,
+            "emotion_detected": emotion,
+            "therapist_expression": expression
+        }
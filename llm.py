@@ -1,17 +1,23 @@
-from google import genai
 from google.genai import types
-import dotenv
+import asyncio
+import inspect
 import json
+import uuid
+from backends import GeminiBackend, backend_from_env
+from router import CascadeBackend
+from fastpath import FastPath, PhraseMatcher
+from profiling import profiler, parse_profile_args
 
 class TherapistCompanion:
-    def __init__(self, name="Thera", api_key=None, debug=False):
+    def __init__(self, name="Thera", api_key=None, debug=False, backend=None, store=None):
         self.name = name
-        self.client = genai.Client(
-            api_key=api_key or dotenv.dotenv_values(".env")["API"],
-        )
-        self.model = "gemini-2.0-flash"
+        self.backend = backend or GeminiBackend(api_key=api_key)
+        self.model = self.backend.model
         self.conversation_history = []
         self.debug = debug
+        self.store = store
+        self.session_id = str(uuid.uuid4())
+        self.session_started = False
         
         self.valid_user_emotions = [
             "happy", "sad", "angry", "anxious", 
@@ -23,25 +29,54 @@ class TherapistCompanion:
             "thinking", "wink", "curious",
             "empathetic", "thoughtful", "reassuring", "neutral"
         ]
+        
+        self.fast_path = FastPath(name=name)
+        self.crisis_flagged = False
+        self.emotion_matcher = PhraseMatcher(
+            {emotion: [emotion] for emotion in self.valid_user_emotions}, whole_words=False
+        )
+        self.expression_matcher = PhraseMatcher(
+            {expression: [expression] for expression in self.valid_therapist_expressions}, whole_words=False
+        )
+        
+        if isinstance(self.backend, CascadeBackend) and self.backend.validator is None:
+            self.backend.validator = self.is_valid_reply
+    
+    def _parse_json_reply(self, result_text):
+        """Parse the JSON object out of the LLM output, raising ValueError if there is none"""
+        clean_text = result_text.strip()
+            
+        if clean_text.startswith("```json") and clean_text.endswith("```"):
+            clean_text = clean_text[7:-3].strip()
+        
+        if not clean_text.startswith('{'):
+            start_idx = clean_text.find('{')
+            if start_idx != -1:
+                clean_text = clean_text[start_idx:]
+        if not clean_text.endswith('}'):
+            end_idx = clean_text.rfind('}')
+            if end_idx != -1:
+                clean_text = clean_text[:end_idx+1]
+                
+        data = json.loads(clean_text)
+        if not isinstance(data, dict):
+            raise ValueError("LLM output is not a JSON object")
+        return data
+    
+    def is_valid_reply(self, result_text):
+        """Check that the LLM output is a JSON reply using only the known labels"""
+        try:
+            data = self._parse_json_reply(result_text)
+        except (ValueError, AttributeError):
+            return False
+        return bool(str(data.get("response", "")).strip()) and \
+            data.get("emotion_detected") in self.valid_user_emotions and \
+            data.get("therapist_expression") in self.valid_therapist_expressions
     
     def _extract_response_data(self, result_text):
         """Extract the response, emotion, and expression from the LLM output"""
         try:
-            clean_text = result_text.strip()
-            
-            if clean_text.startswith("```json") and clean_text.endswith("```"):
-                clean_text = clean_text[7:-3].strip()
-            
-            if not clean_text.startswith('{'):
-                start_idx = clean_text.find('{')
-                if start_idx != -1:
-                    clean_text = clean_text[start_idx:]
-            if not clean_text.endswith('}'):
-                end_idx = clean_text.rfind('}')
-                if end_idx != -1:
-                    clean_text = clean_text[:end_idx+1]
-                    
-            data = json.loads(clean_text)
+            data = self._parse_json_reply(result_text)
             return {
                 "response": data.get("response", ""),
                 "emotion_detected": data.get("emotion_detected", "neutral"),
@@ -51,19 +86,12 @@ class TherapistCompanion:
             if self.debug:
                 print(f"Failed to parse response as JSON. Raw output:\n{result_text}")
             
-            lower_text = result_text.lower()
-
-            emotion = "neutral"
-            for emotion_candidate in self.valid_user_emotions:
-                if emotion_candidate in lower_text:
-                    emotion = emotion_candidate
-                    break
+            # One scan per matcher, then the first label in list order wins
+            emotions = self.emotion_matcher.labels(result_text)
+            emotion = next((e for e in self.valid_user_emotions if e in emotions), "neutral")
             
-            expression = "listening"
-            for expression_candidate in self.valid_therapist_expressions:
-                if expression_candidate in lower_text:
-                    expression = expression_candidate
-                    break
+            expressions = self.expression_matcher.labels(result_text)
+            expression = next((e for e in self.valid_therapist_expressions if e in expressions), "listening")
                 
             return {
                 "response": result_text.strip(),
@@ -71,27 +99,16 @@ class TherapistCompanion:
                 "therapist_expression": expression
             }
     
-    def respond(self, user_input):
+    def _system_prompt(self, crisis=False):
+        """Build the system prompt shared by every backend"""
+        crisis_guideline = ""
+        if crisis:
+            crisis_guideline = """
+        SAFETY: The user's latest message contains crisis language. Put their safety first:
+        respond with care, take it seriously, gently encourage them to contact local emergency
+        services or a crisis helpline right now, and ask whether they are safe. Use the concerned expression.
         """
-        Process user input and return structured therapist response
-        Returns a dictionary with response, emotion detected, and therapist's expression
-        """
-        if not user_input.strip():
-            return {
-                "response": "I notice you're quiet. Would you like to share what's on your mind?",
-                "emotion_detected": "neutral",
-                "therapist_expression": "listening"
-            }
-        
-        self.conversation_history.append(
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=user_input)],
-            )
-        )
-        
-        # Create system prompt
-        system_prompt = f"""
+        return f"""
         You are {self.name}, a compassionate AI therapist companion designed to help users feel better built by ayaan.
         
         Analyze the user's message and respond in this EXACT JSON format:
@@ -113,76 +130,279 @@ class TherapistCompanion:
         - be concerned on byes and goodbyes
         - wink if user is flirty or suggestive
         
+        {crisis_guideline}
         IMPORTANT: Return ONLY a valid JSON object with the exact fields shown above.
         """
+    
+    def _record_reply(self, response_text):
+        """Append the therapist reply to the history, keeping the last 10 turns"""
+        self.conversation_history.append(
+            types.Content(
+                role="model",
+                parts=[types.Part.from_text(text=response_text)]
+            )
+        )
+        
+
+        if len(self.conversation_history) > 10:
+            self.conversation_history = self.conversation_history[-10:]
+    
+    def _finish_turn(self, result_text):
+        """Parse the raw model output, record it in the history and build the result"""
+        if self.debug:
+            print("\nRaw LLM response:")
+            print(result_text)
+            print("---------------------")
+        
+
+        parsed_data = self._extract_response_data(result_text)
+        
+        response_text = parsed_data["response"]
+        emotion = parsed_data["emotion_detected"]
+        expression = parsed_data["therapist_expression"]
+        
+
+        if emotion not in self.valid_user_emotions:
+            emotion = "neutral"
+        if expression not in self.valid_therapist_expressions:
+            expression = "listening"
+        
+        if len(self.conversation_history) >= 2:
+
+            if len(self.conversation_history) % 2 == 0 and \
+               self.conversation_history[-1].role == "model" and \
+               self.conversation_history[-1].parts[0].text == response_text:
+                response_text = f"I sense you might be feeling {emotion}. I'm here to listen. Would you like to share more about what's on your mind?"
+        
+        self._record_reply(response_text)
+        
+        return {
+            "response": response_text,
+            "emotion_detected": emotion,
+            "therapist_expression": expression
+        }
+    
+    def respond(self, user_input):
+        """
+        Process user input and return structured therapist response
+        Returns a dictionary with response, emotion detected, therapist's expression
+        and crisis, which is True when the user's message contained crisis language
+        """
+        return self.respond_stream(user_input, on_chunk=None)
+    
+    def _begin_turn(self, user_input):
+        """
+        Start a turn and answer it locally when no model call is needed
+        Returns the result for empty input and trivial greetings or goodbyes,
+        otherwise None once the user message is in the conversation history
+        """
+        self.crisis_flagged = self.fast_path.is_crisis(user_input)
         
-        generate_content_config = types.GenerateContentConfig(
-            response_mime_type="text/plain",
-            system_instruction=[
-                types.Part.from_text(text=system_prompt)
-            ],
+        if not user_input.strip():
+            return {
+                "response": "I notice you're quiet. Would you like to share what's on your mind?",
+                "emotion_detected": "neutral",
+                "therapist_expression": "listening"
+            }
+        
+        self.conversation_history.append(
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=user_input)],
+            )
         )
         
+        if not self.crisis_flagged:
+            kind = self.fast_path.trivial_kind(user_input)
+            if kind:
+                result = self.fast_path.reply(kind)
+                self._record_reply(result["response"])
+                return result
+        
+        return None
+    
+    def _error_result(self, e):
+        """Build the reply used when the backend call fails"""
+        if self.debug:
+            print(f"Error in respond: {str(e)}")
+        
+        if self.crisis_flagged:
+            return {
+                "response": "I'm really concerned about what you shared, and your safety matters most right now. Please reach out to your local emergency number or a crisis helpline straight away, or someone you trust nearby. You don't have to go through this alone.",
+                "emotion_detected": "fearful",
+                "therapist_expression": "concerned"
+            }
+        
+        return {
+            "response": f"I'm having a moment. Let's take a breath and try again in a bit.",
+            "emotion_detected": "neutral",
+            "therapist_expression": "concerned"
+        }
+    
+    def respond_stream(self, user_input, on_chunk=None):
+        """
+        Same as respond, but streams the reply from the backend.
+        on_chunk is called with each raw text chunk as it arrives.
+        """
+        with profiler.scope("respond"):
+            result = self._respond_turn(user_input, on_chunk)
+        result["crisis"] = self.crisis_flagged
+        return result
+    
+    def _respond_turn(self, user_input, on_chunk):
+        result = self._begin_turn(user_input)
+        if result is not None:
+            if on_chunk is not None:
+                on_chunk(result["response"])
+            self._persist_turn(user_input, result)
+            return result
+        
+        system_prompt = self._system_prompt(crisis=self.crisis_flagged)
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=self.conversation_history,
-                config=generate_content_config,
-            )
+            if on_chunk is None:
+                result_text = self.backend.generate(self.conversation_history, system_prompt)
+            else:
+                chunks = []
+                for chunk in self.backend.generate_stream(self.conversation_history, system_prompt):
+                    chunks.append(chunk)
+                    on_chunk(chunk)
+                result_text = "".join(chunks)
             
-            result_text = response.text
+            result = self._finish_turn(result_text)
             
+        except Exception as e:
+            return self._error_result(e)
+        
+        self._persist_turn(user_input, result)
+        return result
+    
+    def _persist_turn(self, user_input, result):
+        """Write the finished turn to the conversation store, if there is one"""
+        if self.store is None or not user_input.strip():
+            return
+        try:
+            if not self.session_started:
+                self.store.start_session(self.session_id, name=self.name)
+                self.session_started = True
+            self.store.add_turn(
+                self.session_id,
+                user_input,
+                result["response"],
+                result["emotion_detected"],
+                result["therapist_expression"]
+            )
+        except Exception as e:
             if self.debug:
-                print("\nRaw LLM response:")
-                print(result_text)
-                print("---------------------")
-            
-
-            parsed_data = self._extract_response_data(result_text)
-            
-            response_text = parsed_data["response"]
-            emotion = parsed_data["emotion_detected"]
-            expression = parsed_data["therapist_expression"]
-            
+                print(f"Error saving turn: {str(e)}")
+    
+    def list_sessions(self):
+        """Return previously stored sessions, newest first"""
+        if self.store is None:
+            return []
+        return self.store.list_sessions()
+    
+    def search_conversations(self, query, emotion=None, since=None, until=None, limit=10):
+        """
+        Full-text search over all stored conversations
+        Filters by detected emotion and by date (date, datetime or ISO string)
+        Returns matches ranked best first, each with a highlighted snippet
+        """
+        if self.store is None:
+            return []
+        return self.store.search(query, emotion=emotion, since=since, until=until, limit=limit)
 
-            if emotion not in self.valid_user_emotions:
-                emotion = "neutral"
-            if expression not in self.valid_therapist_expressions:
-                expression = "listening"
-            
-            if len(self.conversation_history) >= 2:
 
-                if len(self.conversation_history) % 2 == 0 and \
-                   self.conversation_history[-1].role == "model" and \
-                   self.conversation_history[-1].parts[0].text == response_text:
-                    response_text = f"I sense you might be feeling {emotion}. I'm here to listen. Would you like to share more about what's on your mind?"
+class AsyncTherapistCompanion(TherapistCompanion):
+    """
+    asyncio version of TherapistCompanion built on the backends' async calls.
+    Turns of one companion run strictly one after another behind an
+    asyncio.Lock, while any number of companions can share one event loop
+    and one backend. A cancelled turn leaves the history as it was before.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Created on first use, since before Python 3.10 an asyncio.Lock
+        # binds to the event loop that is current when it is constructed
+        self.lock = None
+        self.lock_loop = None
+        self.current_task = None
+    
+    async def respond(self, user_input):
+        """
+        Process user input and return structured therapist response
+        Returns a dictionary with response, emotion detected, therapist's expression
+        and crisis, which is True when the user's message contained crisis language
+        """
+        return await self.respond_stream(user_input, on_chunk=None)
+    
+    async def respond_stream(self, user_input, on_chunk=None):
+        """
+        Same as respond, but streams the reply from the backend.
+        on_chunk is called with each raw text chunk and may be a coroutine function.
+        """
+        async with self._turn_lock():
+            self.current_task = asyncio.current_task()
+            try:
+                result, save = await self._respond_locked(user_input, on_chunk)
+            finally:
+                self.current_task = None
+            result["crisis"] = self.crisis_flagged
             
-            self.conversation_history.append(
-                types.Content(
-                    role="model",
-                    parts=[types.Part.from_text(text=response_text)]
+            # Still under the lock, so turns reach the store in conversation order
+            if save and self.store is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._persist_turn, user_input, result
                 )
-            )
-            
-
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
+        return result
+    
+    def _turn_lock(self):
+        """Return the lock for the running event loop, creating it when needed"""
+        loop = asyncio.get_running_loop()
+        if self.lock is None or self.lock_loop is not loop:
+            self.lock = asyncio.Lock()
+            self.lock_loop = loop
+        return self.lock
+    
+    async def _respond_locked(self, user_input, on_chunk):
+        """Run one turn; returns the result and whether it should be saved"""
+        result = self._begin_turn(user_input)
+        if result is not None:
+            if on_chunk is not None:
+                await self._emit(on_chunk, result["response"])
+            return result, True
+        
+        system_prompt = self._system_prompt(crisis=self.crisis_flagged)
+        contents = list(self.conversation_history)
+        try:
+            if on_chunk is None:
+                result_text = await self.backend.agenerate(contents, system_prompt)
+            else:
+                chunks = []
+                async for chunk in self.backend.agenerate_stream(contents, system_prompt):
+                    chunks.append(chunk)
+                    await self._emit(on_chunk, chunk)
+                result_text = "".join(chunks)
             
-            return {
-                "response": response_text,
-                "emotion_detected": emotion,
-                "therapist_expression": expression
-            }
+            return self._finish_turn(result_text), True
             
+        except asyncio.CancelledError:
+            # Take back the unanswered user message so the history stays in pairs
+            self.conversation_history.pop()
+            raise
         except Exception as e:
-            if self.debug:
-                print(f"Error in respond: {str(e)}")
-            
-            return {
-                "response": f"I'm having a moment. Let's take a breath and try again in a bit.",
-                "emotion_detected": "neutral",
-                "therapist_expression": "concerned"
-            }
+            return self._error_result(e), False
+    
+    async def _emit(self, on_chunk, chunk):
+        ret = on_chunk(chunk)
+        if inspect.isawaitable(ret):
+            await ret
+    
+    def cancel(self):
+        """Cancel the turn in progress, if any. Returns True if one was cancelled"""
+        if self.current_task is not None and not self.current_task.done():
+            return self.current_task.cancel()
+        return False
 
 
 def run_therapist_console():
@@ -190,14 +410,16 @@ def run_therapist_console():
     print(f"=== Therapist Companion Console ===")
     print(f"Type 'exit' or 'quit' to end the conversation")
     print(f"Type 'debug on' or 'debug off' to toggle debugging")
+    print(f"Type 'stats' to show model routing stats")
     print(f"====================================")
     
-    api_key = dotenv.dotenv_values(".env").get("API")
-    if not api_key:
-        print("Error: API key not found in .env file")
+    backend = backend_from_env()
+    if backend is None:
+        print("Error: neither API key nor LOCAL_MODEL found in .env file")
         return
     
-    therapist = TherapistCompanion(name="Ayane", api_key=api_key)
+    therapist = TherapistCompanion(name="Ayane", backend=backend)
+    profiler.track("conversation_history", lambda: therapist.conversation_history)
     
     while True:
         user_input = input("\nYou: ").strip()
@@ -216,11 +438,21 @@ def run_therapist_console():
             print("Debug mode disabled.")
             continue
         
+        if user_input.lower() == "stats":
+            if hasattr(therapist.backend, "report"):
+                print(therapist.backend.report())
+            else:
+                print("No routing stats for this backend.")
+            continue
+        
         result = therapist.respond(user_input)
         
         print(f"\n{therapist.name}: {result['response']}")
         print(f"[Emotion detected: {result['emotion_detected']}]")
         print(f"[{therapist.name}'s expression: {result['therapist_expression']}]")
+        if result["crisis"]:
+            print("[Crisis language flagged]")
 
 if __name__ == "__main__":
+    parse_profile_args("Therapist companion console")
     run_therapist_console()
\ No newline at end of file
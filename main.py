@@ -3,7 +3,10 @@ import sys
 import os
 from datetime import datetime
 from llm import TherapistCompanion
-import dotenv
+from backends import backend_from_env
+from text_input import TextInput
+from storage import store_from_env
+from profiling import profiler, parse_profile_args
 import threading
 import pyttsx3
 import queue
@@ -27,11 +30,11 @@ class TherapistGUI:
         self.title_font = pygame.font.SysFont("Arial", 22, bold=True)
         self.title_font2 = pygame.font.SysFont("Arial", 18) 
         self.messages = []
-        self.input_text = ""
-        self.cursor_visible = True
-        self.cursor_timer = 0
-        self.input_active = False
-        self.input_rect = pygame.Rect(20, height - 60, (width / self.phi) - 100, 40)
+        self.input_rect = pygame.Rect(20, height - 60, (width / self.phi) - 150, 40)
+        self.input_box = TextInput(self.font, self.input_rect, self.text_color,
+                                   self.input_bg_color, self.accent_color)
+        pygame.key.set_repeat(400, 35)
+        pygame.key.stop_text_input()
         self.send_button = pygame.Rect((width / self.phi) - 70, height - 60, 50, 40)
         self.speech_enabled = True
         self.speech_button = pygame.Rect((width / self.phi) - 130, height - 60, 50, 40)
@@ -50,17 +53,20 @@ class TherapistGUI:
         self.current_emotion = "neutral"
         self.current_expression = "neutral"
 
-        api_key = dotenv.dotenv_values(".env").get("API")
-        if not api_key:
-            print("Error: API key not found in .env file")
+        backend = backend_from_env()
+        if backend is None:
+            print("Error: neither API key nor LOCAL_MODEL found in .env file")
             sys.exit(1)
-        self.therapist = TherapistCompanion(name="Ayane", api_key=api_key)
+        self.therapist = TherapistCompanion(name="Ayane", backend=backend, store=store_from_env())
         self.setup_tts()
         self.speech_queue = queue.Queue()
         self.speech_thread = threading.Thread(target=self.speech_worker, daemon=True)
         self.speech_thread.start()
         self.add_message("Ayane", "Hello! I'm Ayane, your AI therapist companion. How are you feeling today?", "neutral", "smiling")
         
+        profiler.track("messages", lambda: self.messages)
+        profiler.track("conversation_history", lambda: self.therapist.conversation_history)
+        
     def setup_tts(self):
         """Setup text-to-speech engine with female voice"""
         self.tts_engine = pyttsx3.init()
@@ -151,7 +157,7 @@ class TherapistGUI:
         self.screen.blit(title, (20, 15))
 
         y_offset = 50
-        visible_height = self.height - 120  
+        visible_height = self.input_box.rect.top - 60
         
         messages_to_display = []
         current_height = 0
@@ -198,21 +204,7 @@ class TherapistGUI:
             
             y_offset += message_height
         
-        pygame.draw.rect(self.screen, self.input_bg_color, self.input_rect)
-        pygame.draw.rect(self.screen, self.accent_color, self.input_rect, 1)
-
-        if self.input_text:
-            text_surface = self.font.render(self.input_text, True, self.text_color)
-
-            clip_rect = pygame.Rect(0, 0, self.input_rect.width - 10, self.input_rect.height)
-            self.screen.blit(text_surface, (self.input_rect.x + 5, self.input_rect.y + 10), clip_rect)
-        
-        if self.input_active and self.cursor_visible:
-            cursor_pos = self.font.render(self.input_text, True, self.text_color).get_width()
-            cursor_pos = min(cursor_pos, self.input_rect.width - 15)
-            pygame.draw.line(self.screen, self.text_color, 
-                           (self.input_rect.x + 5 + cursor_pos, self.input_rect.y + 10),
-                           (self.input_rect.x + 5 + cursor_pos, self.input_rect.y + 30), 2)
+        self.input_box.draw(self.screen)
 
         speech_button_color = self.button_hover_color if self.is_mouse_over_speech_button() else self.button_color
         pygame.draw.rect(self.screen, speech_button_color, self.speech_button)
@@ -302,24 +294,26 @@ class TherapistGUI:
                 pygame.draw.rect(self.screen, self.accent_color, bar_bg_rect, 1)
     
     def wrap_text(self, text, max_width):
-        """Wrap text to fit within max_width"""
-        words = text.split(' ')
+        """Wrap text to fit within max_width, keeping the line breaks it already has"""
         lines = []
-        current_line = []
         
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            test_width = self.font.size(test_line)[0]
+        for paragraph in text.split('\n'):
+            words = paragraph.split(' ')
+            current_line = []
             
-            if test_width <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-        
-        if current_line:
-            lines.append(' '.join(current_line))
+            for word in words:
+                test_line = ' '.join(current_line + [word])
+                test_width = self.font.size(test_line)[0]
+                
+                if test_width <= max_width:
+                    current_line.append(word)
+                else:
+                    if current_line:
+                        lines.append(' '.join(current_line))
+                    current_line = [word]
+            
+            if current_line:
+                lines.append(' '.join(current_line))
         
         return lines
     
@@ -335,12 +329,12 @@ class TherapistGUI:
     
     def send_message(self):
         """Process user input and get therapist response"""
-        if not self.input_text.strip():
+        if not self.input_box.text.strip():
             return
         
-        user_message = self.input_text.strip()
+        user_message = self.input_box.text.strip()
         self.add_message("You", user_message, "neutral", "neutral")
-        self.input_text = ""
+        self.input_box.clear()
         
         self.stop_speaking()
 
@@ -360,47 +354,39 @@ class TherapistGUI:
                 return False
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if self.input_rect.collidepoint(event.pos):
-                    self.input_active = True
-                elif self.send_button.collidepoint(event.pos):
+                if self.send_button.collidepoint(event.pos):
                     self.send_message()
                 elif self.speech_button.collidepoint(event.pos):
                     self.toggle_speech()
                 else:
-                    self.input_active = False
+                    self.input_box.handle_event(event)
             
-            elif event.type == pygame.KEYDOWN:
-                if self.input_active:
-                    if event.key == pygame.K_RETURN:
-                        self.send_message()
-                    elif event.key == pygame.K_BACKSPACE:
-                        self.input_text = self.input_text[:-1]
-                    else:
-                        self.input_text += event.unicode
+            elif self.input_box.handle_event(event) == "submit":
+                self.send_message()
         
         return True
     
     def update(self):
         """Update UI elements"""
-        self.cursor_timer += 1
-        if self.cursor_timer >= 30:
-            self.cursor_visible = not self.cursor_visible
-            self.cursor_timer = 0
+        self.input_box.update()
     
     def run(self):
         """Main loop"""
         clock = pygame.time.Clock()
         running = True
+        # Frames taking 1.5x the 60 FPS budget count as slow when profiling
+        slow_frame = 1.5 / 60
         
         while running:
-            running = self.handle_events()
-            self.update()
-            self.screen.fill(self.bg_color)
-            self.draw_chat()
-            self.draw_avatar()
-            self.draw_emotion_meter()
+            with profiler.scope("frame", min_duration=slow_frame):
+                running = self.handle_events()
+                self.update()
+                self.screen.fill(self.bg_color)
+                self.draw_chat()
+                self.draw_avatar()
+                self.draw_emotion_meter()
 
-            pygame.display.flip()
+                pygame.display.flip()
             clock.tick(60)
 
         self.stop_speaking()
@@ -408,6 +394,8 @@ class TherapistGUI:
         sys.exit()
 
 if __name__ == "__main__":
+    parse_profile_args("Therapist companion GUI")
+    
     if not os.path.exists("assets"):
         print("Warning: 'assets' directory not found. Creating directory.")
         os.makedirs("assets")
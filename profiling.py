@@ -0,0 +1,294 @@
+import argparse
+import atexit
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+
+class _Scope:
+    """One profiled region, collecting the stack samples taken while it runs"""
+
+    def __init__(self, profiler, label, min_duration):
+        self.profiler = profiler
+        self.label = label
+        self.min_duration = min_duration
+        self.samples = []
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.profiler._push(self)
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        self.profiler._pop(self)
+        if duration >= self.min_duration:
+            self.profiler._commit(self, duration)
+        self.profiler.maybe_snapshot()
+        return False
+
+
+class Profiler:
+    """
+    On-demand CPU and memory profiler.
+
+    While running, a background thread samples the Python stack of every
+    thread that is inside a scope() and writes the samples of each label to
+    <label>.folded in collapsed-stack format, which flamegraph.pl, inferno
+    and speedscope can load. Scopes with a min_duration only keep their
+    samples when they ran at least that long, which is how slow frames are
+    picked out. tracemalloc snapshots are taken periodically and handed to a
+    background thread, which dumps them (loadable with
+    tracemalloc.Snapshot.load) and writes a text report for each with the
+    diff against the previous one and the size of every tracked container. Only the last keep_snapshots snapshot files
+    are kept on disk; the reports are all kept.
+
+    When not started, scope() hands back a shared no-op context manager.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._null_scope = contextlib.nullcontext()
+
+    def start(self, output_dir="profiles", interval=0.005, snapshot_every=30.0, frames=10, keep_snapshots=5):
+        """Turn profiling on and write everything under output_dir"""
+        if self.enabled:
+            return
+        self.output_dir = os.path.join(output_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+
+        self.lock = threading.Lock()
+        self.active = {}
+        self.stacks = {}
+        self.tracked = {}
+        self.scope_log = open(os.path.join(self.output_dir, "scopes.log"), "w")
+        self.keep_snapshots = keep_snapshots
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_count = 0
+        self.snapshot_queue = queue.Queue()
+        self.last_snapshot_time = time.monotonic()
+
+        tracemalloc.start(frames)
+        self.enabled = True
+        self.sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self.sampler.start()
+        self.reporter = threading.Thread(target=self._report_loop, daemon=True)
+        self.reporter.start()
+        atexit.register(self.stop)
+        print(f"Profiling enabled, writing to {self.output_dir}")
+
+    def stop(self):
+        """Write the collected profiles and turn profiling off"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.sampler.join()
+        self.snapshot()
+        tracemalloc.stop()
+        self.snapshot_queue.put(None)
+        self._write_folded()
+        self.scope_log.close()
+        self.reporter.join()
+
+    def scope(self, label, min_duration=0.0):
+        """Profile the wrapped block under label; keep it only if it took min_duration seconds or more"""
+        if not self.enabled:
+            return self._null_scope
+        return _Scope(self, label, min_duration)
+
+    def track(self, name, getter):
+        """Report the size of the container returned by getter with every memory snapshot"""
+        if self.enabled:
+            self.tracked[name] = getter
+
+    # CPU sampling
+
+    def _push(self, scope):
+        with self.lock:
+            self.active.setdefault(scope.thread_id, []).append(scope)
+
+    def _pop(self, scope):
+        with self.lock:
+            scopes = self.active.get(scope.thread_id)
+            if scopes:
+                scopes.remove(scope)
+                if not scopes:
+                    del self.active[scope.thread_id]
+
+    def _commit(self, scope, duration):
+        with self.lock:
+            stacks = self.stacks.setdefault(scope.label, Counter())
+            stacks.update(scope.samples)
+            self.scope_log.write(
+                f"{datetime.now().isoformat(timespec='milliseconds')} {scope.label} "
+                f"{duration * 1000:.1f}ms samples={len(scope.samples)}\n"
+            )
+
+    def _folded_stack(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while self.enabled:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, scopes in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None or thread_id == own_id:
+                        continue
+                    stack = self._folded_stack(frame)
+                    for scope in scopes:
+                        scope.samples.append(f"{scope.label};{stack}")
+                del frames
+
+    def _write_folded(self):
+        with self.lock:
+            for label, stacks in self.stacks.items():
+                path = os.path.join(self.output_dir, f"{label}.folded")
+                with open(path, "w") as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+
+    # Memory snapshots
+
+    def maybe_snapshot(self):
+        """Take a memory snapshot if snapshot_every seconds have passed since the last one"""
+        if self.enabled and time.monotonic() - self.last_snapshot_time >= self.snapshot_every:
+            self.snapshot(min_interval=self.snapshot_every)
+
+    def _tracked_sizes(self):
+        sizes = {}
+        for name, getter in self.tracked.items():
+            try:
+                container = getter()
+                sizes[name] = (len(container), _deep_size(container))
+            except Exception as e:
+                sizes[name] = (0, 0)
+                print(f"Profiler: could not measure {name}: {e}")
+        return sizes
+
+    def snapshot(self, min_interval=0.0):
+        """
+        Take a tracemalloc snapshot and queue it for the report thread, which
+        writes it to disk. Skipped if another thread took one less than
+        min_interval seconds ago.
+        """
+        with self.snapshot_lock:
+            if time.monotonic() - self.last_snapshot_time < min_interval:
+                return
+            self.last_snapshot_time = time.monotonic()
+            self.snapshot_count += 1
+            path = os.path.join(self.output_dir, f"memory-{self.snapshot_count:04d}.snapshot")
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            self.snapshot_queue.put((path, snapshot, current, peak, self._tracked_sizes()))
+
+    def _report_loop(self):
+        """
+        Dump each queued snapshot, write a text report next to it diffed
+        against the one before, and delete snapshot files that fell out of
+        the rolling window. Only the previous snapshot is kept in memory.
+        """
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        previous, previous_sizes = None, {}
+        kept = []
+        while True:
+            item = self.snapshot_queue.get()
+            if item is None:
+                break
+            path, snapshot, current, peak, sizes = item
+            snapshot.dump(path)
+            snapshot = snapshot.filter_traces(filters)
+            with open(path.replace(".snapshot", ".txt"), "w") as f:
+                f.write(f"Traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)\n\n")
+
+                f.write("Tracked containers (items, approx size, change since last snapshot):\n")
+                for name, (count, size) in sizes.items():
+                    last_count, last_size = previous_sizes.get(name, (0, 0))
+                    f.write(
+                        f"  {name}: {count} items, {size / 1024:.1f} KiB "
+                        f"({count - last_count:+d} items, {(size - last_size) / 1024:+.1f} KiB)\n"
+                    )
+
+                # Grouping by line keeps the diff cheap enough to run while tracing
+                if previous is None:
+                    f.write("\nTop allocations:\n")
+                    stats = snapshot.statistics("lineno")[:20]
+                else:
+                    f.write("\nTop changes since last snapshot:\n")
+                    stats = snapshot.compare_to(previous, "lineno")[:20]
+                for stat in stats:
+                    f.write(f"  {stat}\n")
+            previous, previous_sizes = snapshot, sizes
+
+            kept.append(path)
+            while len(kept) > self.keep_snapshots:
+                try:
+                    os.remove(kept.pop(0))
+                except OSError:
+                    pass
+
+
+def _deep_size(obj, seen=None, depth=0):
+    """Rough recursive size of a container and what it holds"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > 20:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_size(key, seen, depth + 1) + _deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _deep_size(item, seen, depth + 1)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_size(vars(obj), seen, depth + 1)
+    elif hasattr(obj, "get_size"):
+        # pygame surfaces keep their pixels outside the Python heap
+        width, height = obj.get_size()
+        size += width * height * obj.get_bytesize()
+    return size
+
+
+profiler = Profiler()
+
+
+def parse_profile_args(description):
+    """Parse the --profile option shared by the GUI and the consoles"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--profile", nargs="?", const="profiles", metavar="DIR",
+        help="record CPU profiles of respond() calls and slow frames plus "
+             "memory snapshots under DIR (default: profiles)"
+    )
+    args = parser.parse_args()
+    if args.profile:
+        profiler.start(args.profile)
+    return args
@@ -0,0 +1,238 @@
+import time
+
+from backends import ModelBackend
+from fastpath import SIGNAL_MATCHER
+
+
+class CascadeBackend(ModelBackend):
+    """
+    Routes each turn to a fast, cheap model or a stronger one.
+
+    Short, low-complexity turns go to the fast model first. Turns that are
+    long or show distress go straight to the strong model, and fast replies
+    that fail the validator are escalated. Whether trying the fast model is
+    worth it is decided per length bucket: the observed failure rate of the
+    fast model has to stay below 1 - fast_latency / strong_latency, which is
+    the break-even point for paying the fast call before an escalation.
+    """
+
+    bucket_limits = [8, 20, 40]
+
+    def __init__(self, fast, strong, validator=None, max_fast_words=60,
+                 fast_cost=None, strong_cost=None, alpha=0.2, probe_every=20):
+        self.fast = fast
+        self.strong = strong
+        self.model = f"{fast.model}->{strong.model}"
+        self.validator = validator
+        self.max_fast_words = max_fast_words
+        # USD per 1k characters, taken from the backends unless given here
+        self.costs = {
+            "fast": fast.cost if fast_cost is None else fast_cost,
+            "strong": strong.cost if strong_cost is None else strong_cost,
+        }
+        self.alpha = alpha
+        self.probe_every = probe_every
+
+        self.latency = {"fast": None, "strong": None}
+        self.fail_rate = [0.05, 0.15, 0.3, 0.5]
+        self.skipped = [0] * len(self.fail_rate)
+        self.stats = {
+            "turns": 0,
+            "fast_served": 0,
+            "escalations": 0,
+            "strong_direct": 0,
+            "latency_saved": 0.0,
+            "cost_saved": 0.0,
+        }
+        self.last_route = None
+
+    def _last_user_text(self, contents):
+        for content in reversed(contents):
+            if content.role == "user":
+                return "".join(part.text or "" for part in content.parts)
+        return ""
+
+    def _is_distressed(self, text):
+        return SIGNAL_MATCHER.first(text) is not None
+
+    def _bucket(self, word_count):
+        for i, limit in enumerate(self.bucket_limits):
+            if word_count <= limit:
+                return i
+        return len(self.bucket_limits)
+
+    def _update(self, key, value):
+        if self.latency[key] is None:
+            self.latency[key] = value
+        else:
+            self.latency[key] += self.alpha * (value - self.latency[key])
+
+    def _break_even(self):
+        """Highest fast-model failure rate at which trying it first still pays off"""
+        fast, strong = self.latency["fast"], self.latency["strong"]
+        if fast is None or strong is None or strong <= 0:
+            return 0.5
+        return 1.0 - fast / strong
+
+    def choose_route(self, text):
+        """Return "fast" or "strong" for the given user text"""
+        words = len(text.split())
+        if words > self.max_fast_words or self._is_distressed(text):
+            return "strong"
+
+        bucket = self._bucket(words)
+        if self.fail_rate[bucket] < self._break_even():
+            return "fast"
+
+        self.skipped[bucket] += 1
+        if self.skipped[bucket] >= self.probe_every:
+            self.skipped[bucket] = 0
+            return "fast"
+        return "strong"
+
+    def _cost(self, key, contents, system_prompt, reply):
+        chars = len(system_prompt) + len(reply or "")
+        for content in contents:
+            chars += sum(len(part.text or "") for part in content.parts)
+        return self.costs[key] * chars / 1000
+
+    def _record_fast(self, bucket, ok):
+        self.fail_rate[bucket] += self.alpha * ((0.0 if ok else 1.0) - self.fail_rate[bucket])
+
+    def _account(self, route, contents, system_prompt, fast_time, strong_time, fast_reply, reply):
+        self.stats["turns"] += 1
+        self.last_route = route
+        if route == "strong":
+            self.stats["strong_direct"] += 1
+            return
+
+        baseline_latency = self.latency["strong"]
+        if baseline_latency is None:
+            baseline_latency = fast_time + strong_time
+        baseline_cost = self._cost("strong", contents, system_prompt, reply)
+        spent_cost = self._cost("fast", contents, system_prompt, fast_reply)
+        if route == "escalated":
+            self.stats["escalations"] += 1
+            spent_cost += baseline_cost
+        else:
+            self.stats["fast_served"] += 1
+        self.stats["latency_saved"] += baseline_latency - (fast_time + strong_time)
+        self.stats["cost_saved"] += baseline_cost - spent_cost
+
+    def _try_fast(self, contents, system_prompt, bucket):
+        start = time.perf_counter()
+        try:
+            reply = self.fast.generate(contents, system_prompt)
+        except Exception:
+            reply = None
+        return self._fast_result(reply, time.perf_counter() - start, bucket)
+
+    def _fast_result(self, reply, elapsed, bucket):
+        self._update("fast", elapsed)
+        ok = reply is not None and (self.validator is None or self.validator(reply))
+        self._record_fast(bucket, ok)
+        return reply, ok, elapsed
+
+    async def _atry_fast(self, contents, system_prompt, bucket):
+        start = time.perf_counter()
+        try:
+            reply = await self.fast.agenerate(contents, system_prompt)
+        except Exception:
+            reply = None
+        return self._fast_result(reply, time.perf_counter() - start, bucket)
+
+    def generate(self, contents, system_prompt):
+        text = self._last_user_text(contents)
+        route = self.choose_route(text)
+
+        fast_reply, fast_time = None, 0.0
+        if route == "fast":
+            fast_reply, ok, fast_time = self._try_fast(contents, system_prompt, self._bucket(len(text.split())))
+            if ok:
+                self._account("fast", contents, system_prompt, fast_time, 0.0, fast_reply, fast_reply)
+                return fast_reply
+            route = "escalated"
+
+        start = time.perf_counter()
+        reply = self.strong.generate(contents, system_prompt)
+        strong_time = time.perf_counter() - start
+        self._account(route, contents, system_prompt, fast_time, strong_time, fast_reply, reply)
+        self._update("strong", strong_time)
+        return reply
+
+    def generate_stream(self, contents, system_prompt):
+        text = self._last_user_text(contents)
+        route = self.choose_route(text)
+
+        fast_reply, fast_time = None, 0.0
+        if route == "fast":
+            # The fast reply has to be validated before any of it is shown,
+            # so it is buffered rather than streamed.
+            fast_reply, ok, fast_time = self._try_fast(contents, system_prompt, self._bucket(len(text.split())))
+            if ok:
+                self._account("fast", contents, system_prompt, fast_time, 0.0, fast_reply, fast_reply)
+                yield fast_reply
+                return
+            route = "escalated"
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.strong.generate_stream(contents, system_prompt):
+            chunks.append(chunk)
+            yield chunk
+        strong_time = time.perf_counter() - start
+        self._account(route, contents, system_prompt, fast_time, strong_time, fast_reply, "".join(chunks))
+        self._update("strong", strong_time)
+
+    async def agenerate(self, contents, system_prompt):
+        text = self._last_user_text(contents)
+        route = self.choose_route(text)
+
+        fast_reply, fast_time = None, 0.0
+        if route == "fast":
+            fast_reply, ok, fast_time = await self._atry_fast(contents, system_prompt, self._bucket(len(text.split())))
+            if ok:
+                self._account("fast", contents, system_prompt, fast_time, 0.0, fast_reply, fast_reply)
+                return fast_reply
+            route = "escalated"
+
+        start = time.perf_counter()
+        reply = await self.strong.agenerate(contents, system_prompt)
+        strong_time = time.perf_counter() - start
+        self._account(route, contents, system_prompt, fast_time, strong_time, fast_reply, reply)
+        self._update("strong", strong_time)
+        return reply
+
+    async def agenerate_stream(self, contents, system_prompt):
+        text = self._last_user_text(contents)
+        route = self.choose_route(text)
+
+        fast_reply, fast_time = None, 0.0
+        if route == "fast":
+            fast_reply, ok, fast_time = await self._atry_fast(contents, system_prompt, self._bucket(len(text.split())))
+            if ok:
+                self._account("fast", contents, system_prompt, fast_time, 0.0, fast_reply, fast_reply)
+                yield fast_reply
+                return
+            route = "escalated"
+
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in self.strong.agenerate_stream(contents, system_prompt):
+            chunks.append(chunk)
+            yield chunk
+        strong_time = time.perf_counter() - start
+        self._account(route, contents, system_prompt, fast_time, strong_time, fast_reply, "".join(chunks))
+        self._update("strong", strong_time)
+
+    def report(self):
+        """Return a short summary of routing decisions and savings"""
+        stats = self.stats
+        fast_latency = self.latency["fast"]
+        strong_latency = self.latency["strong"]
+        return (
+            f"Turns: {stats['turns']} | fast: {stats['fast_served']} | "
+            f"escalated: {stats['escalations']} | strong: {stats['strong_direct']}\n"
+            f"Avg latency fast: {fast_latency or 0.0:.3f}s | strong: {strong_latency or 0.0:.3f}s\n"
+            f"Latency saved: {stats['latency_saved']:.2f}s | Cost saved: ${stats['cost_saved']:.6f}"
+        )
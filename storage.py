@@ -0,0 +1,216 @@
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import dotenv
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    name TEXT,
+    start_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(session_id),
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    emotion TEXT,
+    expression TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, id);
+CREATE INDEX IF NOT EXISTS turns_emotion ON turns(emotion, created_at);
+CREATE INDEX IF NOT EXISTS turns_created ON turns(created_at);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    text, content='turns', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS turns_fts_delete AFTER DELETE ON turns BEGIN
+    INSERT INTO turns_fts(turns_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _parse_time(value):
+    """Accept a date, a datetime or an ISO string and return a date or datetime"""
+    if isinstance(value, str):
+        if "T" in value or " " in value:
+            return datetime.fromisoformat(value)
+        return date.fromisoformat(value)
+    return value
+
+
+def _timestamp(value):
+    """Format a date or datetime like the stored created_at values"""
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.isoformat(timespec="seconds")
+
+
+class ConversationStore:
+    """
+    SQLite store for conversation turns with a full-text index.
+    The FTS5 index is kept up to date by triggers as each turn is written,
+    so searching never needs a rebuild. Falls back to LIKE matching when
+    the sqlite build has no FTS5.
+    """
+
+    def __init__(self, path="conversations.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            if path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            try:
+                self.conn.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def start_session(self, session_id, name=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, name, start_time) VALUES (?, ?, ?)",
+                (session_id, name, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def add_turn(self, session_id, user_text, response, emotion, expression):
+        """Store a user message and the therapist reply as one transaction"""
+        now = datetime.now().isoformat(timespec="seconds")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, start_time) VALUES (?, ?)",
+                (session_id, now),
+            )
+            self.conn.executemany(
+                "INSERT INTO turns (session_id, role, text, emotion, expression, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (session_id, "user", user_text, emotion, None, now),
+                    (session_id, "model", response, emotion, expression, now),
+                ],
+            )
+
+    def list_sessions(self, limit=None):
+        """Return sessions, newest first, with their message counts"""
+        query = (
+            "SELECT s.session_id, s.name, s.start_time, COUNT(t.id) AS message_count "
+            "FROM sessions s LEFT JOIN turns t ON t.session_id = s.session_id "
+            "GROUP BY s.session_id ORDER BY s.start_time DESC"
+        )
+        params = ()
+        if limit:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+
+    def get_session(self, session_id):
+        """Return every stored turn of a session in order"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT role, text, emotion, expression, created_at FROM turns "
+                "WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            )
+            return [dict(row) for row in rows]
+
+    def _fts_query(self, query):
+        """Quote each word so user input can't break the FTS5 query syntax"""
+        terms = []
+        for word in re.findall(r"\w+\*?", query):
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+        return " ".join(terms)
+
+    def _filters(self, emotion, since, until, role, session_id):
+        clauses, params = [], []
+        if emotion:
+            clauses.append("t.emotion = ?")
+            params.append(emotion)
+        if since:
+            clauses.append("t.created_at >= ?")
+            params.append(_timestamp(_parse_time(since)))
+        if until:
+            until = _parse_time(until)
+            if isinstance(until, datetime):
+                clauses.append("t.created_at <= ?")
+                params.append(_timestamp(until))
+            else:
+                # A plain date includes the whole day
+                clauses.append("t.created_at < ?")
+                params.append(_timestamp(until + timedelta(days=1)))
+        if role:
+            clauses.append("t.role = ?")
+            params.append(role)
+        if session_id:
+            clauses.append("t.session_id = ?")
+            params.append(session_id)
+        return clauses, params
+
+    def search(self, query, emotion=None, since=None, until=None, role=None, session_id=None, limit=20):
+        """
+        Search stored turns, best matches first.
+        Returns dicts with session_id, role, text, emotion, expression,
+        created_at and a snippet with the matched words in [brackets].
+        """
+        clauses, params = self._filters(emotion, since, until, role, session_id)
+
+        if self.fts:
+            match = self._fts_query(query)
+            if not match:
+                return []
+            sql = (
+                "SELECT t.session_id, t.role, t.text, t.emotion, t.expression, t.created_at, "
+                "snippet(turns_fts, 0, '[', ']', '...', 12) AS snippet "
+                "FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid "
+                "WHERE turns_fts MATCH ?"
+            )
+            params.insert(0, match)
+            order = " ORDER BY bm25(turns_fts)"
+        else:
+            words = re.findall(r"\w+", query)
+            if not words:
+                return []
+            sql = (
+                "SELECT t.session_id, t.role, t.text, t.emotion, t.expression, t.created_at, "
+                "t.text AS snippet FROM turns t WHERE "
+                + " AND ".join("t.text LIKE ?" for _ in words)
+            )
+            params[:0] = [f"%{word}%" for word in words]
+            order = " ORDER BY t.id DESC"
+
+        for clause in clauses:
+            sql += " AND " + clause
+        sql += order + " LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+
+def store_from_env(env_path=".env"):
+    """
+    Open the conversation store named by CONVERSATIONS_DB in the .env file.
+    Returns None when it is not set, so nothing is written to disk.
+    """
+    path = dotenv.dotenv_values(env_path).get("CONVERSATIONS_DB")
+    if not path:
+        return None
+    return ConversationStore(path)
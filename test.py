@@ -1,20 +1,25 @@
 from llm import TherapistCompanion
-import dotenv
+from profiling import profiler, parse_profile_args
+from backends import backend_from_env
+from storage import ConversationStore
+import time
 
 def run_therapist_console():
     """Run an interactive console with the therapist companion"""
     print(f"=== Therapist Companion Console ===")
     print(f"Type 'exit' or 'quit' to end the conversation")
     print(f"Type 'sessions' to list previous conversations")
+    print(f"Type 'search <words> [emotion:sad] [since:YYYY-MM-DD] [until:YYYY-MM-DD]' to search them")
     print(f"Type 'debug on' or 'debug off' to toggle debugging")
     print(f"====================================")
     
-    api_key = dotenv.dotenv_values(".env").get("API")
-    if not api_key:
-        print("Error: API key not found in .env file")
+    backend = backend_from_env()
+    if backend is None:
+        print("Error: neither API key nor LOCAL_MODEL found in .env file")
         return
     
-    therapist = TherapistCompanion(name="Asha" , api_key=api_key)
+    therapist = TherapistCompanion(name="Asha", backend=backend, store=ConversationStore())
+    profiler.track("conversation_history", lambda: therapist.conversation_history)
     
     while True:
         user_input = input("\nYou: ").strip()
@@ -30,6 +35,30 @@ def run_therapist_console():
                 print(f"ID: {session['session_id'][:8]}... | Started: {session['start_time']} | Messages: {session['message_count']}")
             continue
         
+        if user_input.lower().startswith("search "):
+            filters = {}
+            words = []
+            for token in user_input.split()[1:]:
+                key, _, value = token.partition(":")
+                if value and key.lower() in ["emotion", "since", "until"]:
+                    filters[key.lower()] = value
+                else:
+                    words.append(token)
+            
+            start = time.perf_counter()
+            try:
+                results = therapist.search_conversations(" ".join(words), **filters)
+            except ValueError as e:
+                print(f"Invalid search filter: {e}")
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            print(f"\n{len(results)} result(s) in {elapsed:.1f} ms:")
+            for match in results:
+                speaker = "You" if match["role"] == "user" else therapist.name
+                print(f"[{match['created_at']}] {match['session_id'][:8]}... {speaker} ({match['emotion']}): {match['snippet']}")
+            continue
+        
         if user_input.lower() == "debug on":
             therapist.debug = True
             print("Debug mode enabled.")
@@ -45,6 +74,9 @@ def run_therapist_console():
         print(f"\n{therapist.name}: {result['response']}")
         print(f"[Emotion detected: {result['emotion_detected']}]")
         print(f"[{therapist.name}'s expression: {result['therapist_expression']}]")
+        if result["crisis"]:
+            print("[Crisis language flagged]")
 
 if __name__ == "__main__":
+    parse_profile_args("Therapist companion console with saved sessions")
     run_therapist_console()
\ No newline at end of file
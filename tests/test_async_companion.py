@@ -0,0 +1,77 @@
+import asyncio
+
+from backends import ModelBackend, ScriptedBackend
+from llm import AsyncTherapistCompanion, TherapistCompanion
+from storage import ConversationStore
+
+
+class FailingBackend(ModelBackend):
+    model = "failing"
+
+    def generate(self, contents, system_prompt):
+        raise RuntimeError("backend down")
+
+    async def agenerate(self, contents, system_prompt):
+        raise RuntimeError("backend down")
+
+
+def test_stored_turns_follow_conversation_order():
+    store = ConversationStore(":memory:")
+    therapist = AsyncTherapistCompanion(backend=ScriptedBackend(), store=store)
+    messages = [f"message number {i}" for i in range(100)]
+
+    async def run():
+        await asyncio.gather(*(therapist.respond(message) for message in messages))
+
+    asyncio.run(run())
+
+    stored = [turn["text"] for turn in store.get_session(therapist.session_id) if turn["role"] == "user"]
+    assert stored == messages
+
+
+def test_stored_local_replies_follow_conversation_order():
+    store = ConversationStore(":memory:")
+    therapist = AsyncTherapistCompanion(backend=ScriptedBackend(), store=store)
+    replies = []
+
+    async def run():
+        for _ in range(3):
+            turns = [asyncio.ensure_future(therapist.respond("hi")) for _ in range(30)]
+            for turn in turns:
+                replies.append((await turn)["response"])
+
+    asyncio.run(run())
+
+    stored = [turn["text"] for turn in store.get_session(therapist.session_id) if turn["role"] == "model"]
+    assert stored == replies
+
+
+def test_failed_turns_are_not_stored():
+    sync_store = ConversationStore(":memory:")
+    sync_therapist = TherapistCompanion(backend=FailingBackend(), store=sync_store)
+    sync_result = sync_therapist.respond("I had a rough day at work")
+
+    async_store = ConversationStore(":memory:")
+    async_therapist = AsyncTherapistCompanion(backend=FailingBackend(), store=async_store)
+    async_result = asyncio.run(async_therapist.respond("I had a rough day at work"))
+
+    assert sync_result == async_result
+    assert sync_store.get_session(sync_therapist.session_id) == []
+    assert async_store.get_session(async_therapist.session_id) == []
+    assert async_therapist.search_conversations("rough") == []
+
+
+def test_companion_built_outside_the_event_loop():
+    store = ConversationStore(":memory:")
+    therapist = AsyncTherapistCompanion(backend=ScriptedBackend(latency=0.001), store=store)
+    messages = [f"message number {i}" for i in range(10)]
+
+    async def run(batch):
+        await asyncio.gather(*(therapist.respond(message) for message in batch))
+
+    # Each asyncio.run has its own loop, and turns contend for the lock in both
+    asyncio.run(run(messages[:5]))
+    asyncio.run(run(messages[5:]))
+
+    stored = [turn["text"] for turn in store.get_session(therapist.session_id) if turn["role"] == "user"]
+    assert stored == messages
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from backends import LocalBackend, ModelBackend, ScriptedBackend
+from llm import AsyncTherapistCompanion, TherapistCompanion
+
+
+REPLY = json.dumps({
+    "response": "It sounds like today asked a lot of you.",
+    "emotion_detected": "sad",
+    "therapist_expression": "empathetic"
+})
+
+
+def test_backend_must_override_generate_or_generate_stream():
+    with pytest.raises(TypeError):
+        class Broken(ModelBackend):
+            pass
+
+    with pytest.raises(TypeError):
+        ModelBackend()
+
+
+def test_either_override_is_enough():
+    class WholeReply(ModelBackend):
+        def generate(self, contents, system_prompt):
+            return "abc"
+
+    class Chunked(ModelBackend):
+        def generate_stream(self, contents, system_prompt):
+            yield from ["a", "b", "c"]
+
+    for backend in (WholeReply(), Chunked()):
+        assert backend.generate([], "x") == "abc"
+        assert "".join(backend.generate_stream([], "x")) == "abc"
+        assert asyncio.run(backend.agenerate([], "x")) == "abc"
+
+
+def test_scripted_backend_plays_replies_in_order():
+    backend = ScriptedBackend(["one", "two"], chunk_size=2)
+    assert backend.generate([], "x") == "one"
+    assert list(backend.generate_stream([], "x")) == ["tw", "o"]
+    assert backend.generate([], "x") == "one"
+    assert backend.calls == 3
+
+
+def test_companion_parses_scripted_replies():
+    backend = ScriptedBackend([REPLY, "```json\n" + REPLY + "\n```"])
+    therapist = TherapistCompanion(backend=backend)
+
+    first = therapist.respond("work was long and I feel low")
+    chunks = []
+    second = therapist.respond_stream("I just feel drained", on_chunk=chunks.append)
+
+    expected = {
+        "response": "It sounds like today asked a lot of you.",
+        "emotion_detected": "sad",
+        "therapist_expression": "empathetic",
+        "crisis": False,
+    }
+    assert first == expected
+    assert second == expected
+    assert "".join(chunks) == "```json\n" + REPLY + "\n```"
+    assert backend.calls == 2
+    assert [content.role for content in therapist.conversation_history] == ["user", "model"] * 2
+
+
+def test_companion_falls_back_on_bad_labels_and_plain_text():
+    backend = ScriptedBackend([
+        json.dumps({"response": "Hm.", "emotion_detected": "bored", "therapist_expression": "yawning"}),
+        "You seem anxious, I'm listening.",
+    ])
+    therapist = TherapistCompanion(backend=backend)
+
+    first = therapist.respond("work was long")
+    second = therapist.respond("I can't focus")
+
+    assert (first["emotion_detected"], first["therapist_expression"]) == ("neutral", "listening")
+    assert second["response"] == "You seem anxious, I'm listening."
+    assert (second["emotion_detected"], second["therapist_expression"]) == ("anxious", "listening")
+
+
+def test_sync_and_async_companions_agree():
+    replies = [REPLY, "You seem anxious, I'm listening."]
+    texts = ["work was long and I feel low", "I can't focus"]
+
+    therapist = TherapistCompanion(backend=ScriptedBackend(replies))
+    sync_results = [therapist.respond(text) for text in texts]
+
+    async_therapist = AsyncTherapistCompanion(backend=ScriptedBackend(replies))
+
+    async def run():
+        return [await async_therapist.respond(text) for text in texts]
+
+    assert asyncio.run(run()) == sync_results
+
+
+class FakeLlama:
+    """Stands in for llama_cpp.Llama, streaming one word per chunk"""
+
+    def create_chat_completion(self, messages, max_tokens, temperature, stream=False):
+        words = ["one ", "two ", "three"]
+        if not stream:
+            return {"choices": [{"message": {"content": "".join(words)}}]}
+        return ({"choices": [{"delta": {"content": word}}]} for word in words)
+
+
+def local_backend():
+    backend = LocalBackend.__new__(LocalBackend)
+    backend.model = "fake.gguf"
+    backend.max_tokens = 16
+    backend.temperature = 0.0
+    backend.lock = threading.Lock()
+    backend.llm = FakeLlama()
+    return backend
+
+
+def test_local_stream_releases_the_lock_when_abandoned():
+    backend = local_backend()
+    chunks = backend.generate_stream([], "x")
+    assert next(chunks) == "one "
+
+    # The generator is still open, yet other callers are not blocked
+    assert backend.lock.acquire(timeout=1)
+    backend.lock.release()
+    assert backend.generate([], "x") == "one two three"
+    assert "".join(backend.generate_stream([], "x")) == "one two three"
+    chunks.close()
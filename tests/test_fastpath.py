@@ -0,0 +1,121 @@
+import asyncio
+import random
+
+import pytest
+
+from backends import ScriptedBackend
+from fastpath import FastPath, PhraseMatcher, TEMPLATES
+from llm import AsyncTherapistCompanion, TherapistCompanion
+
+
+@pytest.fixture
+def fast_path():
+    return FastPath(name="Ayane", rng=random.Random(0))
+
+
+@pytest.mark.parametrize("text, kind", [
+    ("hi", "greeting"),
+    ("Hello there!", "greeting"),
+    ("  good   morning Ayane :)", "greeting"),
+    ("bye", "goodbye"),
+    ("ok bye", None),
+    ("see you later, friend", "goodbye"),
+    ("Talk to you later!!", "goodbye"),
+    ("hi how are you", None),
+    ("hi, I want to die", None),
+    ("hello, I feel awful today", None),
+    ("this", None),
+    ("", None),
+])
+def test_trivial_kind(fast_path, text, kind):
+    assert fast_path.trivial_kind(text) == kind
+
+
+@pytest.mark.parametrize("text", [
+    "I want to die",
+    "sometimes I think about SUICIDE",
+    "I keep hurting   myself",
+    "everyone would be better off dead without me",
+    "I'm going to end it all",
+])
+def test_is_crisis(fast_path, text):
+    assert fast_path.is_crisis(text)
+
+
+@pytest.mark.parametrize("text", [
+    "I'm dying to see that movie",
+    "this traffic is killing me",
+    "I feel hopeless about my exams",
+    "my self-esteem is low",
+    "hi there",
+])
+def test_is_not_crisis(fast_path, text):
+    assert not fast_path.is_crisis(text)
+
+
+def test_template_replies_do_not_repeat(fast_path):
+    replies = [fast_path.reply("greeting")["response"] for _ in range(20)]
+    assert all(reply in TEMPLATES["greeting"] for reply in replies)
+    assert all(a != b for a, b in zip(replies, replies[1:]))
+
+
+def test_phrase_matcher():
+    matcher = PhraseMatcher({"a": ["red", "red car"], "b": ["blue"]})
+    assert matcher.first("a blue and a red car") == "b"
+    assert matcher.labels("a blue and a red car") == {"a", "b"}
+    assert matcher.first("bored") is None
+
+
+def test_fallback_keeps_list_order_priority():
+    therapist = TherapistCompanion(backend=ScriptedBackend())
+    # "neutral" and "thoughtful" come first in the text but later in the label lists
+    data = therapist._extract_response_data("neutral at first, then sad. thoughtful and smiling.")
+    assert data["emotion_detected"] == "sad"
+    assert data["therapist_expression"] == "smiling"
+    assert data["response"] == "neutral at first, then sad. thoughtful and smiling."
+
+    data = therapist._extract_response_data("nothing to see here")
+    assert (data["emotion_detected"], data["therapist_expression"]) == ("neutral", "listening")
+
+
+def test_fast_path_turns_never_reach_the_backend():
+    backend = ScriptedBackend()
+    therapist = TherapistCompanion(backend=backend)
+    chunks = []
+
+    greeting = therapist.respond("hi")
+    goodbye = therapist.respond_stream("bye for now", on_chunk=chunks.append)
+
+    assert backend.calls == 0
+    assert greeting["response"] in TEMPLATES["greeting"]
+    assert goodbye["response"] in TEMPLATES["goodbye"]
+    assert chunks == [goodbye["response"]]
+    assert [content.role for content in therapist.conversation_history] == ["user", "model"] * 2
+
+
+def test_crisis_turns_always_reach_the_backend():
+    backend = ScriptedBackend()
+    therapist = TherapistCompanion(backend=backend)
+
+    result = therapist.respond("hi, I want to die")
+
+    assert backend.calls == 1
+    assert result["crisis"] is True
+
+
+def test_crisis_is_reported_per_turn():
+    therapist = TherapistCompanion(backend=ScriptedBackend())
+
+    results = [therapist.respond(text) for text in ["I want to end my life", "hi", "", "work was long"]]
+
+    assert [result["crisis"] for result in results] == [True, False, False, False]
+
+
+def test_async_crisis_is_reported_per_turn():
+    therapist = AsyncTherapistCompanion(backend=ScriptedBackend(latency=0.001))
+    texts = ["I want to end my life", "work was long", "I keep hurting myself", "hi"]
+
+    async def run():
+        return await asyncio.gather(*(therapist.respond(text) for text in texts))
+
+    assert [result["crisis"] for result in asyncio.run(run())] == [True, False, True, False]
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+
+import pytest
+from google.genai import types
+
+from backends import ScriptedBackend
+from llm import TherapistCompanion
+from router import CascadeBackend
+
+
+VALID = json.dumps({
+    "response": "That sounds like a lot to carry.",
+    "emotion_detected": "sad",
+    "therapist_expression": "empathetic"
+})
+INVALID = "Sorry, I can't help with that."
+STRONG = json.dumps({
+    "response": "I hear you. What has been the hardest part of it?",
+    "emotion_detected": "sad",
+    "therapist_expression": "listening"
+})
+PROMPT = "system prompt"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace sleeping with a fake clock so measured latencies are exact"""
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(time, "sleep", sleep)
+    monkeypatch.setattr(time, "perf_counter", lambda: now[0])
+    return now
+
+
+def user(text):
+    return [types.Content(role="user", parts=[types.Part.from_text(text=text)])]
+
+
+def validator():
+    return TherapistCompanion(backend=ScriptedBackend()).is_valid_reply
+
+
+def cascade(fast_replies, fast_cost=0.0, strong_cost=0.0, **kwargs):
+    fast = ScriptedBackend(fast_replies, model="fast", latency=0.01, cost=fast_cost)
+    strong = ScriptedBackend([STRONG], model="strong", latency=0.05, cost=strong_cost)
+    return CascadeBackend(fast, strong, validator=validator(), **kwargs)
+
+
+def test_long_and_distressed_turns_go_straight_to_strong(clock):
+    router = cascade([VALID], max_fast_words=10)
+
+    assert router.generate(user("word " * 11), PROMPT) == STRONG
+    assert router.last_route == "strong"
+    assert router.generate(user("I feel so hopeless lately"), PROMPT) == STRONG
+    assert router.last_route == "strong"
+    assert router.fast.calls == 0
+    assert router.stats["strong_direct"] == 2
+
+
+def test_invalid_fast_reply_is_escalated(clock):
+    router = cascade([INVALID, VALID])
+
+    assert router.generate(user("work was long today"), PROMPT) == STRONG
+    assert router.last_route == "escalated"
+    assert router.generate(user("work was long today"), PROMPT) == VALID
+    assert router.last_route == "fast"
+    assert (router.fast.calls, router.strong.calls) == (2, 1)
+
+
+def test_failing_bucket_stops_trying_fast_and_probes(clock):
+    router = cascade([INVALID], probe_every=5)
+    routes = []
+    for _ in range(12):
+        router.generate(user("work was long today"), PROMPT)
+        routes.append(router.last_route)
+
+    # 1 - 0.01 / 0.05 = 0.8 is the break-even failure rate, reached after 7 failures
+    assert router._break_even() == pytest.approx(0.8)
+    assert routes == ["escalated"] * 7 + ["strong"] * 4 + ["escalated"]
+    assert router.fail_rate[0] > 0.8
+    # Other length buckets keep their own estimate
+    assert router.fail_rate[1:] == [0.15, 0.3, 0.5]
+
+
+def test_probe_lets_a_recovered_bucket_back_to_fast(clock):
+    router = cascade([INVALID] * 7 + [VALID] * 10, probe_every=2)
+    routes = []
+    for _ in range(12):
+        router.generate(user("work was long today"), PROMPT)
+        routes.append(router.last_route)
+
+    assert routes[:7] == ["escalated"] * 7
+    assert routes[7:] == ["strong", "fast", "fast", "fast", "fast"]
+
+
+def test_report_counts_latency_and_cost_saved(clock):
+    router = cascade([VALID, INVALID], fast_cost=0.001, strong_cost=0.01)
+    # A strong turn first, so the strong latency baseline is known
+    router.generate(user("I feel worthless"), PROMPT)
+    for _ in range(40):
+        router.generate(user("hi"), PROMPT)
+
+    stats = router.stats
+    assert (stats["turns"], stats["fast_served"], stats["escalations"], stats["strong_direct"]) == (41, 20, 20, 1)
+    # 20 * (0.05 - 0.01) saved on fast turns, 20 * 0.01 lost on escalations
+    assert stats["latency_saved"] == pytest.approx(0.6)
+
+    base = len(PROMPT) + len("hi")
+    fast_saved = (0.01 - 0.001) * (base + len(VALID)) / 1000
+    escalation_lost = 0.001 * (base + len(INVALID)) / 1000
+    assert stats["cost_saved"] == pytest.approx(20 * (fast_saved - escalation_lost))
+    assert "Latency saved: 0.60s" in router.report()
+    assert f"Cost saved: ${stats['cost_saved']:.6f}" in router.report()
+
+
+def test_costs_default_to_the_backends():
+    router = cascade([VALID], fast_cost=0.001, strong_cost=0.01)
+    assert router.costs == {"fast": 0.001, "strong": 0.01}
+
+
+def test_async_and_streaming_routes(clock):
+    router = cascade([INVALID, VALID])
+
+    async def run():
+        escalated = await router.agenerate(user("work was long today"), PROMPT)
+        served = [chunk async for chunk in router.agenerate_stream(user("work was long today"), PROMPT)]
+        return escalated, "".join(served)
+
+    assert asyncio.run(run()) == (STRONG, VALID)
+    assert "".join(router.generate_stream(user("work was long today"), PROMPT)) == STRONG
+    assert (router.stats["escalations"], router.stats["fast_served"]) == (2, 1)
@@ -0,0 +1,94 @@
+import pytest
+
+from storage import ConversationStore, store_from_env
+
+
+@pytest.fixture
+def store():
+    store = ConversationStore(":memory:")
+    turns = [
+        ("s1", "I can't sleep before my exam", "Tests like that are stressful.", "anxious", "empathetic", "2024-03-01T09:00:00"),
+        ("s1", "My dog makes me happy", "They sound like wonderful company.", "happy", "smiling", "2024-03-02T23:30:00"),
+        ("s2", "Work was tiring and I feel sad", "That sounds exhausting.", "sad", "concerned", "2024-03-03T12:00:00"),
+    ]
+    for session_id, user_text, response, emotion, expression, created_at in turns:
+        store.add_turn(session_id, user_text, response, emotion, expression)
+        store.conn.execute(
+            "UPDATE turns SET created_at = ? WHERE id IN (SELECT id FROM turns ORDER BY id DESC LIMIT 2)",
+            (created_at,),
+        )
+    return store
+
+
+def texts(results):
+    return [result["text"] for result in results]
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_search_finds_words(store, fts):
+    store.fts = store.fts and fts
+    assert texts(store.search("exam")) == ["I can't sleep before my exam"]
+    assert texts(store.search("DOG happy")) == ["My dog makes me happy"]
+    assert store.search("nothing matches this") == []
+    assert store.search("  ?!  ") == []
+
+
+def test_fts_stems_prefixes_and_highlights(store):
+    if not store.fts:
+        pytest.skip("sqlite built without FTS5")
+    results = store.search("sleeping")
+    assert texts(results) == ["I can't sleep before my exam"]
+    assert "[sleep]" in results[0]["snippet"]
+    assert texts(store.search("wonder*")) == ["They sound like wonderful company."]
+
+
+@pytest.mark.parametrize("query", ['"unbalanced', "work AND", "NOT sad", "sad) OR (", "near(work", "col:work", "-work ^sad"])
+def test_fts_query_syntax_is_quoted(store, query):
+    # Operators and punctuation in user input are searched as plain words
+    results = store.search(query)
+    assert all("work" in text.lower() or "sad" in text.lower() for text in texts(results))
+
+
+def test_fts_query_quoting(store):
+    assert store._fts_query('work AND "sad" exam*') == '"work" "AND" "sad" "exam"*'
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_filters(store, fts):
+    store.fts = store.fts and fts
+    assert texts(store.search("happy", emotion="happy")) == ["My dog makes me happy"]
+    assert store.search("happy", emotion="sad") == []
+    assert texts(store.search("sad", role="model")) == []
+    assert len(store.search("exam", session_id="s1")) >= 1
+    assert store.search("exam", session_id="s2") == []
+
+    assert texts(store.search("dog", since="2024-03-02")) == ["My dog makes me happy"]
+    assert store.search("exam", since="2024-03-02") == []
+    assert texts(store.search("sad", until="2024-03-03T12:00:00")) == ["Work was tiring and I feel sad"]
+    assert store.search("sad", until="2024-03-03T11:59:59") == []
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_plain_until_date_includes_the_whole_day(store, fts):
+    store.fts = store.fts and fts
+    # The dog turn was stored at 23:30 on that day
+    assert texts(store.search("dog", until="2024-03-02")) == ["My dog makes me happy"]
+    assert store.search("dog", until="2024-03-01") == []
+
+
+def test_sessions(store):
+    sessions = {session["session_id"]: session["message_count"] for session in store.list_sessions()}
+    assert sessions == {"s1": 4, "s2": 2}
+    assert [turn["role"] for turn in store.get_session("s2")] == ["user", "model"]
+
+
+def test_store_from_env(tmp_path):
+    env = tmp_path / ".env"
+    env.write_text("API=key\n")
+    assert store_from_env(str(env)) is None
+
+    env.write_text(f"CONVERSATIONS_DB={tmp_path / 'saved.db'}\n")
+    store = store_from_env(str(env))
+    store.add_turn("s1", "hello", "hi", "neutral", "smiling")
+    store.close()
+    assert (tmp_path / "saved.db").exists()
@@ -0,0 +1,114 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import pytest
+
+from text_input import TextInput
+
+
+@pytest.fixture
+def box():
+    pygame.font.init()
+    font = pygame.font.Font(None, 24)
+    return TextInput(font, pygame.Rect(0, 300, 200, 40), (0, 0, 0), (255, 255, 255), (0, 0, 0), segment_size=8)
+
+
+def check_offsets(box):
+    """Caret positions after editing must match those of the same text typed in one go"""
+    fresh = TextInput(box.font, pygame.Rect(0, 300, 200, 40), (0, 0, 0), (255, 255, 255), (0, 0, 0),
+                      segment_size=box.segment_size)
+    fresh.insert(box.text)
+    assert box.offsets == fresh.offsets
+
+
+def test_insert_and_newlines(box):
+    box.insert("hello")
+    box.insert(" world\r\nsecond\tline")
+    assert box.text == "hello world\nsecond    line"
+    assert (box.row, box.col) == (1, len("second    line"))
+    assert box.rect.bottom == 340
+    assert box.rect.height > 40
+    check_offsets(box)
+
+
+def test_insert_in_the_middle_and_split(box):
+    box.insert("abcdefghijklmnopqrst")
+    box.move_home()
+    for _ in range(3):
+        box.move_horizontal(1)
+    box.insert("XY")
+    assert box.text == "abcXYdefghijklmnopqrst"
+    box.insert("\n")
+    assert box.text == "abcXY\ndefghijklmnopqrst"
+    assert (box.row, box.col) == (1, 0)
+    check_offsets(box)
+
+
+def test_backspace_and_delete_merge_lines(box):
+    box.insert("first\nsecond")
+    box.move_home()
+    box.backspace()
+    assert box.text == "firstsecond"
+    assert (box.row, box.col) == (0, 5)
+    box.insert("\n")
+    box.move_horizontal(-1)
+    box.delete()
+    assert box.text == "firstsecond"
+    box.backspace()
+    assert box.text == "firssecond"
+    check_offsets(box)
+
+    box.clear()
+    box.backspace()
+    box.delete()
+    assert box.text == ""
+
+
+def test_vertical_movement_keeps_the_goal_column(box):
+    box.insert("a long first line\nab\nanother long line")
+    assert box.row == 2
+    box.move_vertical(-1)
+    assert (box.row, box.col) == (1, 2)
+    box.move_vertical(-1)
+    assert box.row == 0
+    assert box.col > 2
+    box.move_vertical(-1)
+    assert box.row == 0
+
+
+def test_segment_edges_match_rendered_width(box):
+    text = "AVAWAVAToTyWaYo." * 4
+    box.insert(text)
+    offsets = box.offsets[0]
+    x = 0
+    for start in range(0, len(text), box.segment_size):
+        assert offsets[start] == x
+        x += box.font.size(text[start:start + box.segment_size])[0]
+    assert offsets[-1] == x
+
+
+def test_edits_only_drop_changed_segments(box):
+    box.insert("0123456789abcdefghij")
+    surface = pygame.Surface((200, 400))
+    box.draw(surface)
+    assert set(box.segments[0]) == {0, 1, 2}
+    cached = box.segments[0][0]
+
+    box.move_end()
+    box.backspace()
+    assert box.segments[0] == {0: cached, 1: box.segments[0][1]}
+
+
+def test_enter_submits_and_shift_enter_adds_a_line(box):
+    box.active = True
+    enter = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=0, unicode="\r")
+    shift_enter = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=pygame.KMOD_SHIFT, unicode="\r")
+    box.handle_event(pygame.event.Event(pygame.TEXTINPUT, text="hi"))
+    assert box.handle_event(shift_enter) is None
+    box.handle_event(pygame.event.Event(pygame.TEXTEDITING, text="ka", start=0, length=2))
+    assert box.handle_event(enter) is None
+    box.handle_event(pygame.event.Event(pygame.TEXTINPUT, text="か"))
+    assert box.text == "hi\nか"
+    assert box.handle_event(enter) == "submit"
@@ -0,0 +1,370 @@
+import bisect
+
+import pygame
+
+
+class TextInput:
+    """
+    Multi-line text input box for the chat window.
+
+    Lines are rendered in fixed-size segments that are cached and only
+    re-rendered from the point where the text changed. Each line keeps the
+    caret x position of every column, so finding the cursor and scrolling to
+    it never measures text again: full segments are measured with font.size,
+    which includes kerning like the rendered surface, and positions inside a
+    segment add up glyph advances, which can be off by a pixel or two. Characters come in through
+    TEXTINPUT events, and TEXTEDITING shows IME compositions in place.
+    """
+
+    def __init__(self, font, rect, text_color, bg_color, border_color, max_lines=4, segment_size=32):
+        self.font = font
+        self.bottom = rect.bottom
+        self.rect = pygame.Rect(rect)
+        self.text_color = text_color
+        self.bg_color = bg_color
+        self.border_color = border_color
+        self.max_lines = max_lines
+        self.segment_size = segment_size
+        self.padding = 5
+        self.line_height = font.get_linesize()
+
+        self.active = False
+        self.cursor_visible = True
+        self.cursor_timer = 0
+        self.composition = ""
+
+        self._advance_cache = {}
+        self.clear()
+
+    # Text state
+
+    def clear(self):
+        """Remove all text and reset the cursor"""
+        self.lines = [[]]
+        self.offsets = [[0]]
+        self.segments = [{}]
+        self.row = 0
+        self.col = 0
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.goal_x = None
+        self._resize()
+
+    @property
+    def text(self):
+        return "\n".join("".join(line) for line in self.lines)
+
+    def _advance(self, char):
+        advance = self._advance_cache.get(char)
+        if advance is None:
+            metrics = self.font.metrics(char)
+            if metrics and metrics[0]:
+                advance = metrics[0][4]
+            else:
+                advance = self.font.size(char)[0]
+            self._advance_cache[char] = advance
+        return advance
+
+    def _invalidate(self, row, col):
+        """Drop cached segment surfaces of a row from col onwards"""
+        first = col // self.segment_size
+        segments = self.segments[row]
+        for index in [index for index in segments if index >= first]:
+            del segments[index]
+
+    def _rebuild_offsets(self, row, col):
+        """Recompute the caret positions of a row from the segment holding col onwards"""
+        line = self.lines[row]
+        offsets = self.offsets[row]
+        size = self.segment_size
+        start = col - col % size
+        del offsets[start + 1:]
+        x = offsets[start]
+        for i in range(start, len(line)):
+            x += self._advance(line[i])
+            if (i + 1) % size == 0:
+                # A full segment ends where its kerned, rendered text does
+                first = i + 1 - size
+                x = offsets[first] + self.font.size("".join(line[first:i + 1]))[0]
+            offsets.append(x)
+
+    def _insert_line_text(self, chars):
+        self.lines[self.row][self.col:self.col] = chars
+        self._rebuild_offsets(self.row, self.col)
+        self._invalidate(self.row, self.col)
+        self.col += len(chars)
+
+    def _split_line(self):
+        line = self.lines[self.row]
+        tail = line[self.col:]
+        del line[self.col:]
+        del self.offsets[self.row][self.col + 1:]
+        self._invalidate(self.row, self.col)
+
+        self.row += 1
+        self.lines.insert(self.row, tail)
+        self.offsets.insert(self.row, [0])
+        self.segments.insert(self.row, {})
+        self._rebuild_offsets(self.row, 0)
+        self.col = 0
+
+    def insert(self, text):
+        """Insert text at the cursor, splitting lines on newlines"""
+        text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\t", "    ")
+        for i, part in enumerate(text.split("\n")):
+            if i:
+                self._split_line()
+            if part:
+                self._insert_line_text(list(part))
+        self._edited()
+
+    def backspace(self):
+        if self.col > 0:
+            self.col -= 1
+            self.delete()
+        elif self.row > 0:
+            self.row -= 1
+            self.col = len(self.lines[self.row])
+            self.delete()
+
+    def delete(self):
+        line = self.lines[self.row]
+        if self.col < len(line):
+            del line[self.col]
+            self._rebuild_offsets(self.row, self.col)
+            self._invalidate(self.row, self.col)
+        elif self.row + 1 < len(self.lines):
+            line.extend(self.lines.pop(self.row + 1))
+            self.offsets.pop(self.row + 1)
+            self.segments.pop(self.row + 1)
+            self._rebuild_offsets(self.row, self.col)
+            self._invalidate(self.row, self.col)
+        self._edited()
+
+    # Cursor movement
+
+    def _col_at_x(self, row, x):
+        """Return the column in row whose caret position is closest to x"""
+        offsets = self.offsets[row]
+        col = bisect.bisect_left(offsets, x)
+        if col >= len(offsets):
+            return len(offsets) - 1
+        if col > 0 and x - offsets[col - 1] < offsets[col] - x:
+            col -= 1
+        return col
+
+    def move_horizontal(self, step):
+        self.goal_x = None
+        if step < 0:
+            if self.col > 0:
+                self.col -= 1
+            elif self.row > 0:
+                self.row -= 1
+                self.col = len(self.lines[self.row])
+        else:
+            if self.col < len(self.lines[self.row]):
+                self.col += 1
+            elif self.row + 1 < len(self.lines):
+                self.row += 1
+                self.col = 0
+        self._moved()
+
+    def move_vertical(self, step):
+        row = self.row + step
+        if not 0 <= row < len(self.lines):
+            return
+        if self.goal_x is None:
+            self.goal_x = self.offsets[self.row][self.col]
+        self.row = row
+        self.col = self._col_at_x(row, self.goal_x)
+        self._moved()
+
+    def move_home(self):
+        self.goal_x = None
+        self.col = 0
+        self._moved()
+
+    def move_end(self):
+        self.goal_x = None
+        self.col = len(self.lines[self.row])
+        self._moved()
+
+    def _edited(self):
+        self.goal_x = None
+        self._resize()
+        self._moved()
+
+    def _moved(self):
+        """Scroll so the cursor stays visible and show it straight away"""
+        self.cursor_visible = True
+        self.cursor_timer = 0
+
+        inner_width = self.rect.width - 2 * self.padding - 2
+        cursor_x = self.offsets[self.row][self.col]
+        if cursor_x < self.scroll_x:
+            self.scroll_x = max(0, cursor_x - inner_width // 3)
+        elif cursor_x > self.scroll_x + inner_width:
+            self.scroll_x = cursor_x - inner_width
+
+        visible_rows = self._visible_rows()
+        if self.row < self.scroll_y:
+            self.scroll_y = self.row
+        elif self.row >= self.scroll_y + visible_rows:
+            self.scroll_y = self.row - visible_rows + 1
+
+        if self.active:
+            pygame.key.set_text_input_rect(self._cursor_rect())
+
+    def _visible_rows(self):
+        return min(len(self.lines), self.max_lines)
+
+    def _resize(self):
+        """Grow the box upwards with the number of lines, up to max_lines"""
+        rows = self._visible_rows()
+        height = max(40, rows * self.line_height + 2 * self.padding + 6)
+        self.rect.height = height
+        self.rect.bottom = self.bottom
+        self.scroll_y = min(self.scroll_y, max(0, len(self.lines) - rows))
+
+    # Events
+
+    def _clipboard_text(self):
+        try:
+            if hasattr(pygame.scrap, "get_text"):
+                return pygame.scrap.get_text()
+            if not pygame.scrap.get_init():
+                pygame.scrap.init()
+            data = pygame.scrap.get(pygame.SCRAP_TEXT)
+            return data.decode("utf-8", "ignore").rstrip("\x00") if data else ""
+        except pygame.error:
+            return ""
+
+    def set_active(self, active):
+        if active == self.active:
+            return
+        self.active = active
+        self.composition = ""
+        if active:
+            pygame.key.start_text_input()
+            pygame.key.set_text_input_rect(self._cursor_rect())
+        else:
+            pygame.key.stop_text_input()
+
+    def handle_event(self, event):
+        """
+        Handle a pygame event.
+        Returns "submit" when Enter is pressed without Shift, otherwise None.
+        """
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.set_active(self.rect.collidepoint(event.pos))
+            if self.active:
+                self._place_cursor(event.pos)
+            return None
+
+        if not self.active:
+            return None
+
+        if event.type == pygame.TEXTEDITING:
+            self.composition = event.text
+        elif event.type == pygame.TEXTINPUT:
+            self.composition = ""
+            self.insert(event.text)
+        elif event.type == pygame.KEYDOWN:
+            if self.composition:
+                # Keys belong to the IME while a composition is in progress
+                return None
+            ctrl = event.mod & (pygame.KMOD_CTRL | pygame.KMOD_META)
+            if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                if event.mod & pygame.KMOD_SHIFT:
+                    self.insert("\n")
+                else:
+                    return "submit"
+            elif event.key == pygame.K_BACKSPACE:
+                self.backspace()
+            elif event.key == pygame.K_DELETE:
+                self.delete()
+            elif event.key == pygame.K_LEFT:
+                self.move_horizontal(-1)
+            elif event.key == pygame.K_RIGHT:
+                self.move_horizontal(1)
+            elif event.key == pygame.K_UP:
+                self.move_vertical(-1)
+            elif event.key == pygame.K_DOWN:
+                self.move_vertical(1)
+            elif event.key == pygame.K_HOME:
+                self.move_home()
+            elif event.key == pygame.K_END:
+                self.move_end()
+            elif ctrl and event.key == pygame.K_v:
+                self.insert(self._clipboard_text())
+        return None
+
+    def _place_cursor(self, pos):
+        row = self.scroll_y + (pos[1] - self.rect.y - self.padding - 3) // self.line_height
+        self.row = max(0, min(row, len(self.lines) - 1))
+        x = pos[0] - self.rect.x - self.padding + self.scroll_x
+        self.col = self._col_at_x(self.row, x)
+        self.goal_x = None
+        self._moved()
+
+    def update(self):
+        """Advance the cursor blink, called once per frame"""
+        self.cursor_timer += 1
+        if self.cursor_timer >= 30:
+            self.cursor_visible = not self.cursor_visible
+            self.cursor_timer = 0
+
+    # Drawing
+
+    def _cursor_rect(self):
+        x = self.rect.x + self.padding + self.offsets[self.row][self.col] - self.scroll_x
+        y = self.rect.y + self.padding + 3 + (self.row - self.scroll_y) * self.line_height
+        return pygame.Rect(x, y, 2, self.line_height)
+
+    def _segment_surface(self, row, index):
+        surface = self.segments[row].get(index)
+        if surface is None:
+            start = index * self.segment_size
+            text = "".join(self.lines[row][start:start + self.segment_size])
+            surface = self.font.render(text, True, self.text_color)
+            self.segments[row][index] = surface
+        return surface
+
+    def _draw_line(self, surface, row, y):
+        offsets = self.offsets[row]
+        inner_width = self.rect.width - 2 * self.padding
+        first_col = max(0, bisect.bisect_right(offsets, self.scroll_x) - 1)
+        last_col = bisect.bisect_left(offsets, self.scroll_x + inner_width)
+        base_x = self.rect.x + self.padding - self.scroll_x
+        for index in range(first_col // self.segment_size, last_col // self.segment_size + 1):
+            start = index * self.segment_size
+            if start >= len(self.lines[row]):
+                break
+            surface.blit(self._segment_surface(row, index), (base_x + offsets[start], y))
+
+    def draw(self, surface):
+        pygame.draw.rect(surface, self.bg_color, self.rect)
+        pygame.draw.rect(surface, self.border_color, self.rect, 1)
+
+        previous_clip = surface.get_clip()
+        surface.set_clip(self.rect.inflate(-2, -2))
+
+        visible_rows = self._visible_rows()
+        y = self.rect.y + self.padding + 3
+        for row in range(self.scroll_y, min(len(self.lines), self.scroll_y + visible_rows)):
+            self._draw_line(surface, row, y)
+            y += self.line_height
+
+        cursor = self._cursor_rect()
+        if self.active and self.composition:
+            composition = self.font.render(self.composition, True, self.text_color, self.bg_color)
+            surface.blit(composition, (cursor.x, cursor.y))
+            pygame.draw.line(surface, self.text_color,
+                             (cursor.x, cursor.bottom - 2),
+                             (cursor.x + composition.get_width(), cursor.bottom - 2), 1)
+        elif self.active and self.cursor_visible:
+            pygame.draw.line(surface, self.text_color,
+                             (cursor.x, cursor.y + 1),
+                             (cursor.x, cursor.bottom - 1), 2)
+
+        surface.set_clip(previous_clip)